@@ -1,11 +1,38 @@
+import numpy as np
 import pandas as pd
-import glob
+import hashlib
+import re
+import shutil
 import argparse
 import os
 import json
 import matplotlib.pyplot as plt
-import seaborn as sns
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+CACHE_VERSION = 2
+CACHE_ENTRY = re.compile(r"[0-9a-f]{40}\.parquet(\.tmp)?")
+CACHE_VERSION_DIR = re.compile(r"v\d+")
+CACHE_APP_DIR = "subscription-chaser"
+COLUMN_NAMES = {
+    'transaction_date': 'date',
+    'description': 'vendor',
+    'amount': 'charge'
+}
 
 def load_exclusions(file_path):
     exclusions = {
@@ -19,60 +46,216 @@ def load_exclusions(file_path):
                 for category in ['recurring', 'spending']:
                     exclusions[category]['vendors'] = set(map(str.lower, data.get(category, {}).get('vendors', []) or []))
                     exclusions[category]['keywords'] = set(map(str.lower, data.get(category, {}).get('keywords', []) or []))
-                    exclusions[category]['charges'] = set(data.get(category, {}).get('charges', []) or [])
+                    exclusions[category]['charges'] = {round(float(charge) * 100) for charge in data.get(category, {}).get('charges', []) or []}
             except json.JSONDecodeError:
                 print("Warning: Exclusion file is not valid JSON. Ignoring exclusions.")
     return exclusions
 
-def load_chase_statements(folder_path):
-    folder_path = os.path.abspath(folder_path)
-    files = glob.glob(os.path.join(folder_path, "*.csv")) + glob.glob(os.path.join(folder_path, "*.CSV"))
-    df_list = [pd.read_csv(file) for file in files]
-    df = pd.concat(df_list, ignore_index=True).drop_duplicates()
+def _column_key(col):
+    return col.strip().lower().replace(" ", "_")
+
+def read_statement(file_path):
+    header = pd.read_csv(file_path, nrows=0).columns
+    usecols = [col for col in header if _column_key(col) in COLUMN_NAMES]
+    dtype = {col: 'float64' for col in usecols if _column_key(col) == 'amount'}
+    return pd.read_csv(file_path, engine="pyarrow", usecols=usecols, dtype=dtype)
+
+def _statement_cache_dir(folder_path, cache_dir):
+    folder_key = hashlib.sha1(os.path.abspath(folder_path).encode()).hexdigest()
+    return os.path.join(cache_dir, CACHE_APP_DIR, f"v{CACHE_VERSION}", folder_key)
+
+def _cache_path(file_path, statement_cache_dir):
+    stat = os.stat(file_path)
+    key = f"{CACHE_VERSION}:{file_path}:{stat.st_mtime_ns}:{stat.st_size}"
+    return os.path.join(statement_cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".parquet")
+
+def prune_cache(cache_dir, statement_cache_dir, keep):
+    app_dir = os.path.join(cache_dir, CACHE_APP_DIR)
+    if os.path.isdir(app_dir):
+        with os.scandir(app_dir) as entries:
+            for entry in entries:
+                if entry.is_dir() and CACHE_VERSION_DIR.fullmatch(entry.name) and entry.name != f"v{CACHE_VERSION}":
+                    shutil.rmtree(entry.path)
+    if os.path.isdir(statement_cache_dir):
+        keep = {os.path.basename(path) for path in keep}
+        with os.scandir(statement_cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and CACHE_ENTRY.fullmatch(entry.name) and entry.name not in keep:
+                    os.remove(entry.path)
+
+def load_statement(file_path, statement_cache_dir=None):
+    if statement_cache_dir is None:
+        return normalize(read_statement(file_path))
+    cached = _cache_path(file_path, statement_cache_dir)
+    if os.path.exists(cached):
+        return pd.read_parquet(cached, engine="pyarrow")
+    df = normalize(read_statement(file_path))
+    os.makedirs(statement_cache_dir, exist_ok=True)
+    df.to_parquet(cached + ".tmp", engine="pyarrow", compression="zstd", index=False)
+    os.replace(cached + ".tmp", cached)
     return df
 
-def clean_data(df, exclusions, category):
-    df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
-    df = df.rename(columns={
-        'transaction_date': 'date',
-        'description': 'vendor',
-        'amount': 'charge'
-    })
-    df['date'] = pd.to_datetime(df['date'])
+def _statement_files(folder_path):
+    folder_path = os.path.abspath(folder_path)
+    with os.scandir(folder_path) as entries:
+        return [entry.path for entry in entries if entry.is_file() and entry.name.lower().endswith(".csv")]
+
+def load_chase_statements(folder_path, cache_dir=None):
+    files = _statement_files(folder_path)
+    statement_cache_dir = None if cache_dir is None else _statement_cache_dir(folder_path, cache_dir)
+    with ThreadPoolExecutor(max_workers=min(32, len(files) or 1)) as executor:
+        df_list = list(executor.map(lambda file: load_statement(file, statement_cache_dir), files))
+    if cache_dir is not None:
+        prune_cache(cache_dir, statement_cache_dir, [_cache_path(file, statement_cache_dir) for file in files])
+    df = pd.concat(df_list, ignore_index=True)
+    df['vendor'] = df['vendor'].astype('category')
+    return df.drop_duplicates(subset=['date', 'vendor', 'charge'], ignore_index=True)
+
+def load_chase_statements_polars(folder_path):
+    frames = []
+    for file in _statement_files(folder_path):
+        lf = pl.scan_csv(file, infer_schema=False)
+        frames.append(lf.select(
+            pl.col(col).alias(COLUMN_NAMES[_column_key(col)])
+            for col in lf.collect_schema().names() if _column_key(col) in COLUMN_NAMES
+        ))
+    date = pl.col('date')
+    two_digit_year = date.str.contains(r'^\d{1,2}/\d{1,2}/\d{2}$')
+    statements = (
+        pl.concat(frames, how='diagonal')
+        .with_columns(
+            pl.when(two_digit_year)
+            .then(date.str.to_date('%m/%d/%y', strict=False))
+            .otherwise(pl.coalesce(date.str.to_date('%m/%d/%Y', strict=False), date.str.to_date('%Y-%m-%d', strict=False))),
+            date.alias('raw_date'),
+            pl.col('charge').cast(pl.Float64)
+        )
+        .unique(subset=['date', 'vendor', 'charge'], maintain_order=True)
+        .with_columns(
+            (pl.col('charge') * 100).round().cast(pl.Int32).alias('charge_cents'),
+            (date.dt.year() * 12 + date.dt.month() - 1).cast(pl.Int16).alias('month_code')
+        )
+        .collect()
+    )
+    unparsed = statements.filter(date.is_null() & pl.col('raw_date').is_not_null())['raw_date']
+    if len(unparsed):
+        raise ValueError(f"Unable to parse transaction dates: {', '.join(unparsed.unique(maintain_order=True).head(5))}")
+    return statements.select(['date', 'vendor', 'charge', 'charge_cents', 'month_code'])
+
+def normalize(df):
+    df.columns = [_column_key(col) for col in df.columns]
+    df = df.rename(columns=COLUMN_NAMES)
+    dates = pd.to_datetime(df['date'], format='%m/%d/%Y', cache=True, errors='coerce')
+    unparsed = dates.isna() & df['date'].notna()
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(df.loc[unparsed, 'date'], format='mixed')
+    df['date'] = dates
     df['charge'] = df['charge'].astype(float)
-    df = df.drop_duplicates(subset=['date', 'vendor', 'charge'])
-    
-    df = df[~df['vendor'].str.lower().isin(exclusions[category]['vendors'])]
-    df = df[~df['vendor'].str.lower().apply(lambda x: any(keyword in x for keyword in exclusions[category]['keywords']))]
-    df = df[~df['charge'].isin(exclusions[category]['charges'])]
-    
-    return df[['date', 'vendor', 'charge']]
+    df['charge_cents'] = (df['charge'] * 100).round().astype('Int32')
+    df['month_code'] = (df['date'].dt.year * 12 + df['date'].dt.month - 1).astype('Int16')
+    return df[['date', 'vendor', 'charge', 'charge_cents', 'month_code']]
 
-def find_recurring_charges(df):
-    recurring_charges = defaultdict(lambda: defaultdict(lambda: {'total_spent': 0, 'months': set()}))
-    
-    grouped = df.groupby(['vendor', 'charge'])
-    for (vendor, charge), transactions in grouped:
-        months = set(transactions['date'].dt.to_period('M'))
-        if len(months) > 2:
-            total_spent = charge * len(months)
-            recurring_charges[vendor][charge]['total_spent'] = total_spent
-            recurring_charges[vendor][charge]['months'] = months
+def _contains_any(values, keywords):
+    if ahocorasick is not None and '' not in keywords:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return np.fromiter((next(automaton.iter(value), None) is not None for value in values), dtype=bool, count=len(values))
+    pattern = "|".join(map(re.escape, keywords))
+    return np.asarray(pd.Index(values).str.contains(pattern, regex=True))
+
+def apply_exclusions(df, exclusions):
+    categories_lower = df['vendor'].cat.categories.str.lower()
+    excluded_categories = categories_lower.isin(exclusions['vendors'])
+    if exclusions['keywords']:
+        excluded_categories |= _contains_any(categories_lower, exclusions['keywords'])
+    excluded = np.isin(df['vendor'].cat.codes.to_numpy(), np.flatnonzero(excluded_categories))
+    excluded |= df['charge_cents'].isin(exclusions['charges']).to_numpy(bool, na_value=False)
+    return df.loc[~excluded]
+
+def _scan_recurring_runs(vendor_code, charge_cents, month_code, min_months):
+    n = len(vendor_code)
+    run_start = np.empty(n, np.int64)
+    run_months = np.empty(n, np.int64)
+    count = 0
+    i = 0
+    while i < n:
+        j = i
+        months = 0
+        last_month = -1
+        while j < n and vendor_code[j] == vendor_code[i] and charge_cents[j] == charge_cents[i]:
+            if month_code[j] >= 0 and month_code[j] != last_month:
+                months += 1
+                last_month = month_code[j]
+            j += 1
+        if months > min_months:
+            run_start[count] = i
+            run_months[count] = months
+            count += 1
+        i = j
+    return run_start[:count], run_months[:count]
+
+if njit is not None:
+    _scan_recurring_runs = njit(cache=True)(_scan_recurring_runs)
+
+def find_recurring_charges(df, top_n=None):
+    if njit is None:
+        recurring = df.groupby(['vendor', 'charge_cents'], observed=True)['month_code'].nunique().reset_index(name='months')
+        recurring = recurring[recurring['months'] > 2]
+        recurring = pd.DataFrame({
+            'vendor': recurring['vendor'].to_numpy(str),
+            'charge': recurring['charge_cents'].to_numpy('int64') / 100,
+            'months': recurring['months'].to_numpy('int64')
+        })
+    else:
+        df = df[df['vendor'].notna() & df['charge_cents'].notna()]
+        vendor_code = df['vendor'].cat.codes.to_numpy(np.int32)
+        charge_cents = df['charge_cents'].to_numpy(np.int32)
+        month_code = df['month_code'].to_numpy(np.int16, na_value=-1)
+        order = np.lexsort((month_code, charge_cents, vendor_code))
+        vendor_code, charge_cents, month_code = vendor_code[order], charge_cents[order], month_code[order]
+        run_start, months = _scan_recurring_runs(vendor_code, charge_cents, month_code, 2)
+        recurring = pd.DataFrame({
+            'vendor': df['vendor'].cat.categories[vendor_code[run_start]],
+            'charge': charge_cents[run_start] / 100,
+            'months': months
+        })
+    recurring.insert(2, 'total_spent', recurring['charge'] * recurring['months'])
     
-    sorted_recurring = sorted(
-        [(vendor, charge, data['total_spent'], data['months'])
-         for vendor, charges in recurring_charges.items() for charge, data in charges.items()],
-        key=lambda x: x[2], reverse=True
+    if top_n is None:
+        return recurring.sort_values(by='total_spent', ascending=False, kind='stable', ignore_index=True)
+    return recurring.nsmallest(top_n, 'total_spent').reset_index(drop=True)
+
+def find_recurring_charges_polars(df, exclusions, top_n=None):
+    vendor_lower = pl.col('vendor').str.to_lowercase()
+    excluded = vendor_lower.is_in(list(exclusions['vendors'])) | pl.col('charge_cents').is_in(list(exclusions['charges']))
+    if exclusions['keywords']:
+        excluded = excluded | vendor_lower.str.contains_any(list(exclusions['keywords']))
+    recurring = (
+        df.lazy()
+        .drop_nulls(['vendor', 'charge_cents'])
+        .filter(~excluded)
+        .group_by(['vendor', 'charge_cents'])
+        .agg(pl.col('month_code').drop_nulls().n_unique().cast(pl.Int64).alias('months'))
+        .filter(pl.col('months') > 2)
+        .select('vendor', (pl.col('charge_cents') / 100).alias('charge'), 'months')
+        .select('vendor', 'charge', (pl.col('charge') * pl.col('months')).alias('total_spent'), 'months')
     )
-    return sorted_recurring
+    if top_n is None:
+        recurring = recurring.sort(['total_spent', 'vendor', 'charge'], descending=[True, False, False])
+    else:
+        recurring = recurring.sort(['total_spent', 'vendor', 'charge']).head(top_n)
+    return recurring.collect().to_pandas()
 
 def flag_subscription_keywords(df):
     keywords = ['membership', 'subscription', 'renewal']
-    df['flagged'] = df['vendor'].str.lower().apply(lambda x: any(keyword in x for keyword in keywords))
-    return df[df['flagged']]
+    flagged_categories = _contains_any(df['vendor'].cat.categories.str.lower(), keywords)
+    flagged = np.isin(df['vendor'].cat.codes.to_numpy(), np.flatnonzero(flagged_categories))
+    return df[flagged]
 
 def top_vendors_by_spending(df, top_n=25):
-    top_vendors = df.groupby('vendor')['charge'].sum().sort_values().head(top_n)
+    top_vendors = df.groupby('vendor', observed=True)['charge'].sum().nsmallest(top_n)
     return top_vendors.reset_index()
 
 def most_expensive_charges(df, top_n=25):
@@ -81,8 +264,8 @@ def most_expensive_charges(df, top_n=25):
 
 def print_results(recurring_charges, top_vendors, expensive_charges, flagged_subscriptions):
     print("\nRecurring Charges:")
-    for vendor, charge, total_spent, months in sorted(recurring_charges, key=lambda x: x[2], reverse=True):
-        print(f"{vendor}: ${charge:.2f} per month, Total Spent: ${total_spent:.2f}, Months: {len(months)}")
+    for vendor, charge, total_spent, months in recurring_charges.itertuples(index=False, name=None):
+        print(f"{vendor}: ${charge:.2f} per month, Total Spent: ${total_spent:.2f}, Months: {months}")
     
     print("\nTop Vendors by Spending:")
     print(top_vendors.to_string(index=False))
@@ -93,35 +276,46 @@ def print_results(recurring_charges, top_vendors, expensive_charges, flagged_sub
     print("\nFlagged Subscription Transactions:")
     print(flagged_subscriptions[['vendor', 'charge']].to_string(index=False))
 
+def _plot_bars(ax, labels, values, palette, title, xlabel, ylabel):
+    bars = pd.Series(np.asarray(values), index=np.asarray(labels, dtype=object)).groupby(level=0, sort=False).mean()
+    positions = np.arange(len(bars))
+    colors = plt.get_cmap(palette)(np.linspace(0, 1, len(bars) + 2)[1:-1])
+    ax.barh(positions, bars.to_numpy(), color=colors)
+    ax.set_yticks(positions, labels=bars.index)
+    ax.invert_yaxis()
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
 def generate_summary_report(top_vendors, expensive_charges, recurring_charges, flagged_subscriptions):
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))
     
-    recurring_df = pd.DataFrame(recurring_charges, columns=['Vendor', 'Charge', 'Total Spent', 'Months'])
-    recurring_df = recurring_df.sort_values(by='Total Spent', ascending=True)
-    sns.barplot(y=recurring_df['Vendor'], x=recurring_df['Total Spent'], hue=recurring_df['Vendor'], palette='Purples_r', ax=axes[0, 0], legend=False)
-    axes[0, 0].set_title("Recurring Charges Sorted by Total Spent")
+    recurring_df = recurring_charges.sort_values(by='total_spent', ascending=True)
+    _plot_bars(axes[0, 0], recurring_df['vendor'], recurring_df['total_spent'], 'Purples_r', "Recurring Charges Sorted by Total Spent", 'Total Spent', 'Vendor')
     
     flagged_subscriptions = flagged_subscriptions.sort_values(by='charge', ascending=True)
-    sns.barplot(y=flagged_subscriptions['vendor'], x=flagged_subscriptions['charge'], hue=flagged_subscriptions['vendor'], palette='Blues_r', ax=axes[0, 1], legend=False)
-    axes[0, 1].set_title("Flagged Subscription Transactions")
+    _plot_bars(axes[0, 1], flagged_subscriptions['vendor'], flagged_subscriptions['charge'], 'Blues_r', "Flagged Subscription Transactions", 'charge', 'vendor')
     
-    sns.barplot(y=expensive_charges['vendor'], x=expensive_charges['charge'], hue=expensive_charges['vendor'], palette='Reds_r', ax=axes[1, 1], legend=False)
-    axes[1, 1].set_title("Most Expensive Charges")
+    _plot_bars(axes[1, 1], expensive_charges['vendor'], expensive_charges['charge'], 'Reds_r', "Most Expensive Charges", 'charge', 'vendor')
     
-    sns.barplot(y=top_vendors['vendor'], x=top_vendors['charge'], hue=top_vendors['vendor'], palette='coolwarm', ax=axes[1, 0], legend=False)
-    axes[1, 0].set_title("Top Vendors by Spending")
+    _plot_bars(axes[1, 0], top_vendors['vendor'], top_vendors['charge'], 'coolwarm', "Top Vendors by Spending", 'charge', 'vendor')
     
     plt.tight_layout()
     plt.show()
 
-def main(folder_path, exclusion_file):
+def main(folder_path, exclusion_file, cache_dir=None, engine='pandas', top_recurring=None):
     exclusions = load_exclusions(exclusion_file)
-    df = load_chase_statements(folder_path)
-    
-    df_recurring = clean_data(df, exclusions, 'recurring')
-    recurring_charges = find_recurring_charges(df_recurring)
+    if engine == 'polars':
+        statements = load_chase_statements_polars(folder_path)
+        recurring_charges = find_recurring_charges_polars(statements, exclusions['recurring'], top_recurring)
+        df = statements.to_pandas().astype({'vendor': 'category', 'charge_cents': 'Int32', 'month_code': 'Int16'})
+        del statements
+    else:
+        df = load_chase_statements(folder_path, cache_dir)
+        recurring_charges = find_recurring_charges(apply_exclusions(df, exclusions['recurring']), top_recurring)
     
-    df_spending = clean_data(df, exclusions, 'spending')
+    df_spending = apply_exclusions(df, exclusions['spending'])
+    del df
     top_vendors = top_vendors_by_spending(df_spending)
     expensive_charges = most_expensive_charges(df_spending)
     flagged_subscriptions = flag_subscription_keywords(df_spending)
@@ -133,6 +327,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze Chase credit card statements.")
     parser.add_argument("--folder_path", type=str, default="statements")
     parser.add_argument("--exclusion_file", type=str, default="exclusions.json")
+    parser.add_argument("--cache_dir", type=str, default=".cache")
+    parser.add_argument("--no_cache", action="store_true")
+    parser.add_argument("--engine", type=str, choices=["pandas", "polars"], default="pandas")
+    parser.add_argument("--top_recurring", type=int, default=None)
     args = parser.parse_args()
+    if args.engine == "polars" and pl is None:
+        parser.error("--engine polars requires the polars package")
+    if args.top_recurring is not None and args.top_recurring < 1:
+        parser.error("--top_recurring must be a positive integer")
     
-    main(args.folder_path, args.exclusion_file)
+    main(args.folder_path, args.exclusion_file, None if args.no_cache else args.cache_dir, args.engine, args.top_recurring)